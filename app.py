@@ -2,7 +2,13 @@ import streamlit as st
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import os
+import atexit
 import logging
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Iterator
 import google.generativeai as genai
 from sentence_transformers import SentenceTransformer
 
@@ -17,6 +23,10 @@ load_dotenv()
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# Initialize session state to keep this session's recent question embeddings across reruns
+if "emb_cache" not in st.session_state:
+    st.session_state.emb_cache = {}
+
 # Set up the page configuration for the Streamlit app 
 st.set_page_config(
     page_title="Supply Chain RAG Assistant",
@@ -33,41 +43,139 @@ password = os.getenv("NEO4J_PASSWORD")
 api_key = os.getenv("GEMINI_API_KEY")
 genai.configure(api_key=api_key)
 
-# Load Sentence Transformer model for embedding-based comparison of questions and data
-try:
+# Maximum number of question embeddings and Gemini responses kept in the in-process caches
+CACHE_SIZE = 1024
+
+# Maximum number of question embeddings kept per Streamlit session
+SESSION_CACHE_SIZE = 128
+
+# Function to normalize a question so trivially different spellings share cache entries
+def normalize_question(question: str) -> str:
+    """Lowercase the question and collapse its whitespace."""
+    return " ".join(question.lower().split())
+
+# Create an LRU-cached question encoder that is shared across Streamlit reruns and sessions
+@st.cache_resource
+def get_question_encoder(_model):
+    """Wrap the model's encode call in an LRU cache keyed on the normalized question."""
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def encode_question(question: str) -> tuple:
+        return tuple(_model.encode(question, normalize_embeddings=True).tolist())
+    return encode_question
+
+# Create the Gemini response cache and its lock, shared across Streamlit reruns and sessions
+@st.cache_resource
+def get_response_cache() -> tuple:
+    """Create the LRU cache of Gemini responses, keyed on context and question hashes."""
+    return OrderedDict(), threading.Lock()
+
+RESPONSE_CACHE, RESPONSE_CACHE_LOCK = get_response_cache()
+
+# Function to look up a cached Gemini response, marking it as recently used
+def get_cached_response(cache_key: tuple):
+    """Return the cached response for the key, or None if it isn't cached."""
+    with RESPONSE_CACHE_LOCK:
+        if cache_key not in RESPONSE_CACHE:
+            return None
+        RESPONSE_CACHE.move_to_end(cache_key)
+        return RESPONSE_CACHE[cache_key]
+
+# Function to store a Gemini response, evicting the least recently used entry when full
+def cache_response(cache_key: tuple, response: str) -> None:
+    """Store the response under the key in the LRU response cache."""
+    with RESPONSE_CACHE_LOCK:
+        RESPONSE_CACHE[cache_key] = response
+        RESPONSE_CACHE.move_to_end(cache_key)
+        if len(RESPONSE_CACHE) > CACHE_SIZE:
+            RESPONSE_CACHE.popitem(last=False)
+
+# Load Sentence Transformer model once, shared across Streamlit reruns and sessions
+@st.cache_resource
+def get_embedder():
+    """Load and warm up the Sentence Transformer model used to embed questions."""
     print("Loading model...")
-    embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2", device="cpu")
+    # Run the encoder through ONNX Runtime with the int8 (AVX512-VNNI) quantized export of the model
+    model = SentenceTransformer(
+        "sentence-transformers/all-MiniLM-L6-v2",
+        device="cpu",
+        backend="onnx",
+        model_kwargs={"file_name": "onnx/model_qint8_avx512_vnni.onnx"}
+    )
+    # Run one warm-up encode so the first user question doesn't pay for kernel selection
+    model.encode(["warmup"])
     print("Model loaded successfully")
+    return model
+
+# Create the Gemini model once, shared across Streamlit reruns and sessions
+@st.cache_resource
+def get_gemini_model():
+    """Create the Google Gemini model used for text generation."""
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+GEMINI_MODEL = get_gemini_model()
+
+# Deadline in seconds for a whole Gemini request. With streaming this covers the full generation,
+# not just the first token, so it is set well above normal answer times; a cut-off answer is
+# marked as interrupted rather than mixed with an error message
+GEMINI_TIMEOUT = 60
+
+# Load Sentence Transformer model for embedding-based comparison of questions and data
+try:
+    embedding_model = get_embedder()
+    encode_question = get_question_encoder(embedding_model)
 except Exception as e:
     print(f"Error loading model: {e}")
 
+# Create a single Neo4j driver that is shared across Streamlit reruns and sessions
+@st.cache_resource
+def get_neo4j_driver():
+    """Create the Neo4j driver once and reuse its connection pool."""
+    neo4j_driver = GraphDatabase.driver(uri, auth=(username, password), max_connection_pool_size=20)
+    # Close the pooled connections when the Streamlit server shuts down
+    atexit.register(neo4j_driver.close)
+    return neo4j_driver
+
+# Connect to Neo4j, leaving retrieval to report the failure if the connection details are invalid
+try:
+    DRIVER = get_neo4j_driver()
+except Exception as e:
+    print(f"Error creating Neo4j driver: {e}")
+
+# Number of products retrieved from the vector index for each question
+CONTEXT_LIMIT = 3
+
+# Cypher query used to retrieve context, kept as a constant so Neo4j reuses the same cached plan
+CONTEXT_QUERY = """
+CALL db.index.vector.queryNodes('product_description_embeddings', $limit, $embedding)
+YIELD node AS p, score
+OPTIONAL MATCH (p)<-[:SUPPLIES]-(s:Supplier)
+OPTIONAL MATCH (p)-[:STORED_AT]->(w:Warehouse)
+RETURN p.name as product_name,
+       p.description as product_description,
+       collect(DISTINCT {type: 'SUPPLIES', name: s.name}) as suppliers,
+       collect(DISTINCT {type: 'STORED_AT', name: w.name, location: w.location}) as warehouses,
+       score
+ORDER BY score DESC
+"""
+
 # Function to retrieve relevant context from Neo4j based on the user's question
 def get_relevant_context(question: str) -> str:
     """Retrieve relevant context from Neo4j based on the question."""
     try:
-        # Connect to Neo4j using the provided connection details
-        driver = GraphDatabase.driver(uri, auth=(username, password))
-
-        with driver.session() as session:
-            # Convert the user's question into an embedding for comparison
-            question_embedding = embedding_model.encode(question).tolist()
-
-            # Query Neo4j to find products with descriptions similar to the question embedding
-            result = session.run("""
-                MATCH (p:Product)
-                WHERE p.description_embedding IS NOT NULL
-                WITH p, 
-                     reduce(s = 0, i in range(0, size(p.description_embedding)-1) | 
-                           s + p.description_embedding[i] * $embedding[i]) as similarity
-                ORDER BY similarity DESC
-                LIMIT 3
-                OPTIONAL MATCH (p)<-[:SUPPLIES]-(s:Supplier)
-                OPTIONAL MATCH (p)-[:STORED_AT]->(w:Warehouse)
-                RETURN p.name as product_name, 
-                       p.description as product_description,
-                       collect(DISTINCT {type: 'SUPPLIES', name: s.name}) as suppliers,
-                       collect(DISTINCT {type: 'STORED_AT', name: w.name, location: w.location}) as warehouses
-            """, embedding=question_embedding)
+        with DRIVER.session() as session:
+            # Convert the user's question into an embedding for comparison, reusing the session's cached one if present
+            embedding_cache = st.session_state.emb_cache
+            cache_key = normalize_question(question)
+            question_embedding = embedding_cache.get(cache_key)
+            if question_embedding is None:
+                question_embedding = encode_question(cache_key)
+                embedding_cache[cache_key] = question_embedding
+                # Evict the oldest embedding once the session cache is full
+                if len(embedding_cache) > SESSION_CACHE_SIZE:
+                    embedding_cache.pop(next(iter(embedding_cache)))
+
+            # Query the product description vector index for the products closest to the question embedding
+            result = session.run(CONTEXT_QUERY, limit=CONTEXT_LIMIT, embedding=question_embedding)
 
             # Format the query results into a readable context
             context = []
@@ -91,26 +199,53 @@ def get_relevant_context(question: str) -> str:
         # Log and return error message in case of an exception
         logger.error(f"Error retrieving context: {e}")
         return "Error retrieving context."
-    finally:
-        if 'driver' in locals():
-            driver.close()
 
 # Function to generate a response using Google Gemini's generative AI model
-def generate_gemini_response(context: str, question: str) -> str:
-    """Generate a response using the Google Gemini model."""
+def generate_gemini_response(context: str, question: str) -> Iterator[str]:
+    """Stream a response from the Google Gemini model, chunk by chunk."""
+    # Serve repeated questions over the same context from the response cache
+    cache_key = (
+        hashlib.sha1(context.encode()).hexdigest(),
+        hashlib.sha1(normalize_question(question).encode()).hexdigest()
+    )
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
     try:
-        # Initialize the Gemini model and generate a response based on the context and question
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(f"Use the following context to answer the question.\n\nContext: {context}\nQuestion: {question}\nAnswer:")
-        
-        # Return the generated response if available, else return a fallback message
-        if response and hasattr(response, 'text'):
-            return response.text.strip()
-        return "No response received from Gemini."
+        # Stream a response from the shared Gemini model based on the context and question
+        response = GEMINI_MODEL.generate_content(
+            f"Use the following context to answer the question.\n\nContext: {context}\nQuestion: {question}\nAnswer:",
+            stream=True,
+            request_options={"timeout": GEMINI_TIMEOUT}
+        )
+
+        # Yield the generated text as it arrives, reading it through the parts since
+        # chunk.text raises on chunks without text (e.g. a finish-only or safety stop chunk)
+        for chunk in response:
+            text = "".join(part.text for part in chunk.parts if "text" in part)
+            if text:
+                chunks.append(text)
+                yield text
+
+        # Yield a fallback message if Gemini returned no text
+        if not chunks:
+            yield "No response received from Gemini."
+            return
     except Exception as e:
-        # Log and return error message if an error occurs during response generation
+        # Log and yield error message if an error occurs during response generation
         logger.error(f"Error generating Gemini response: {e}")
-        return "Error generating response."
+        if chunks:
+            # Mark a partial answer as interrupted instead of gluing the error onto its last word
+            yield "\n\n_(response interrupted)_"
+        else:
+            yield "Error generating response."
+        return
+
+    # Cache the complete response, outside the try so a cache failure can't look like a Gemini failure
+    cache_response(cache_key, "".join(chunks))
 
 # Streamlit UI: Title of the app
 st.title("📦 Supply Chain RAG Assistant")
@@ -156,8 +291,7 @@ if prompt := st.chat_input("Ask a question about the supply chain..."):
     
     # Generate and display the assistant's response using Gemini
     with st.chat_message("assistant"):
-        response = generate_gemini_response(context, prompt)
-        st.markdown(response)
+        response = st.write_stream(generate_gemini_response(context, prompt)).strip()
     
     # Add the assistant's response to the chat history
     st.session_state.messages.append({"role": "assistant", "content": response})
@@ -1,7 +1,7 @@
 from neo4j import GraphDatabase  
-from langchain_core.documents import Document  
 from sentence_transformers import SentenceTransformer 
-import json  
+import torch
+import orjson
 import os  
 from dotenv import load_dotenv 
 
@@ -15,6 +15,11 @@ AUTH = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
 # Initialize Neo4j driver with the provided URI and authentication details
 driver = GraphDatabase.driver(URI, auth=AUTH)
 
+# Size torch's thread pool to the CPUs this process may actually run on (honours affinity/container limits)
+cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+torch.set_num_threads(cpu_count or 4)
+torch.set_num_interop_threads(2)
+
 # Initialize the SentenceTransformer model for generating embeddings
 model = SentenceTransformer("all-MiniLM-L6-v2")
 
@@ -28,8 +33,8 @@ RELATIONSHIPS_FILE = 'data/relationships.json'
 # Function to load data from a JSON file
 def load_json(file_path):
     """Loads a JSON file and returns its contents."""
-    with open(file_path, 'r') as file:
-        return json.load(file)
+    with open(file_path, 'rb') as file:
+        return orjson.loads(file.read())
 
 # Load data from JSON files into corresponding variables
 products = load_json(PRODUCTS_FILE)
@@ -38,11 +43,63 @@ warehouses = load_json(WAREHOUSES_FILE)
 routes = load_json(ROUTES_FILE)
 relationships = load_json(RELATIONSHIPS_FILE)
 
+# Function to create uniqueness constraints on the node ids used by MERGE and MATCH
+def create_constraints():
+    """Create uniqueness constraints (and their backing indexes) on Product, Supplier and Warehouse ids."""
+    with driver.session() as session:
+        session.run("CREATE CONSTRAINT product_id IF NOT EXISTS FOR (p:Product) REQUIRE p.id IS UNIQUE")
+        session.run("CREATE CONSTRAINT supplier_id IF NOT EXISTS FOR (s:Supplier) REQUIRE s.id IS UNIQUE")
+        session.run("CREATE CONSTRAINT warehouse_id IF NOT EXISTS FOR (w:Warehouse) REQUIRE w.id IS UNIQUE")
+
+# Number of products written to Neo4j per write transaction
+PRODUCT_BATCH_SIZE = 500
+
+# Cypher query that merges a batch of products, storing each embedding as a FLOAT32 vector
+PRODUCT_MERGE_QUERY = """
+UNWIND $rows AS row
+MERGE (p:Product {id: row.id})
+SET p.name = row.name,
+    p.description = row.description,
+    p.price = row.price,
+    p.category = row.category
+WITH p, row
+CALL db.create.setNodeVectorProperty(p, 'description_embedding', row.embedding)
+"""
+
+# Function to write one batch of products inside a managed write transaction
+def write_product_batch(tx, rows):
+    """Merge a batch of products and their embeddings into Neo4j."""
+    tx.run(PRODUCT_MERGE_QUERY, rows=rows)
+
 # Function to load product data into Neo4j
 def load_products():
     """Load product data into Neo4j and create embeddings for descriptions."""
-    # Create a vector index for the product description embeddings (if it doesn't already exist)
+    # Generate the embeddings for all product descriptions in batched forward passes
+    descriptions = [product["description"] for product in products]
+    embeddings = model.encode(
+        descriptions,
+        batch_size=64,
+        show_progress_bar=True,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
+
+    # Pair each product with its generated embedding
+    rows = [
+        {
+            "id": product["id"],
+            "name": product["name"],
+            "description": product["description"],
+            "price": product["price"],
+            "category": product["category"],
+            "embedding": embedding.tolist()
+        }
+        for product, embedding in zip(products, embeddings)
+    ]
+
+    # Use a single session for the index creation and all product writes
     with driver.session() as session:
+        # Create a vector index for the product description embeddings (if it doesn't already exist)
         session.run("""
             CREATE VECTOR INDEX product_description_embeddings IF NOT EXISTS
             FOR (p:Product) ON (p.description_embedding)
@@ -52,92 +109,69 @@ def load_products():
             }}
         """)
 
-    # Loop through the products and create/merge each one in Neo4j
-    for product in products:
-        doc = Document(page_content=product["description"], metadata={"id": product["id"]})
-        # Generate the embedding for the product description using the SentenceTransformer model
-        embedding = model.encode([doc.page_content])[0].tolist()
-
-        with driver.session() as session:
-            # Insert the product data into Neo4j, including the generated embedding
-            session.run("""
-                MERGE (p:Product {id: $id})
-                SET p.name = $name,
-                    p.description = $description,
-                    p.price = $price,
-                    p.category = $category,
-                    p.description_embedding = $embedding
-            """, {
-                "id": product["id"],
-                "name": product["name"],
-                "description": product["description"],
-                "price": product["price"],
-                "category": product["category"],
-                "embedding": embedding
-            })
+        # Insert the products into Neo4j in fixed-size batches, each in its own write transaction
+        for start in range(0, len(rows), PRODUCT_BATCH_SIZE):
+            session.execute_write(write_product_batch, rows[start:start + PRODUCT_BATCH_SIZE])
 
 # Function to load supplier data into Neo4j
 def load_suppliers():
     """Load supplier data into Neo4j."""
     with driver.session() as session:
-        for supplier in suppliers:
-            # Insert or update the supplier data in Neo4j
-            session.run("""
-                MERGE (s:Supplier {id: $id})
-                SET s.name = $name,
-                    s.location = $location,
-                    s.specialization = $specialization
-            """, supplier)
+        # Insert or update all suppliers in Neo4j in a single batched statement
+        session.run("""
+            UNWIND $rows AS row
+            MERGE (s:Supplier {id: row.id})
+            SET s.name = row.name,
+                s.location = row.location,
+                s.specialization = row.specialization
+        """, rows=suppliers)
 
 # Function to load warehouse data into Neo4j
 def load_warehouses():
     """Load warehouse data into Neo4j."""
     with driver.session() as session:
-        for warehouse in warehouses:
-            # Insert or update the warehouse data in Neo4j
-            session.run("""
-                MERGE (w:Warehouse {id: $id})
-                SET w.name = $name,
-                    w.location = $location,
-                    w.capacity = $capacity
-            """, warehouse)
+        # Insert or update all warehouses in Neo4j in a single batched statement
+        session.run("""
+            UNWIND $rows AS row
+            MERGE (w:Warehouse {id: row.id})
+            SET w.name = row.name,
+                w.location = row.location,
+                w.capacity = row.capacity
+        """, rows=warehouses)
 
 # Function to load transportation route data into Neo4j
 def load_transportation_routes():
     """Load transportation route data (connections between warehouses) into Neo4j."""
     with driver.session() as session:
-        for route in routes:
-            # Create relationships between warehouses based on the transportation routes
-            session.run("""
-                MATCH (w1:Warehouse {id: $from})
-                MATCH (w2:Warehouse {id: $to})
-                MERGE (w1)-[r:CONNECTED_TO]->(w2)
-                SET r.distance = $distance,
-                    r.duration = $duration
-            """, route)
+        # Create relationships between warehouses for all transportation routes in a single batched statement
+        session.run("""
+            UNWIND $rows AS row
+            MATCH (w1:Warehouse {id: row.`from`})
+            MATCH (w2:Warehouse {id: row.to})
+            MERGE (w1)-[r:CONNECTED_TO]->(w2)
+            SET r.distance = row.distance,
+                r.duration = row.duration
+        """, rows=routes)
 
 # Function to create relationships between suppliers, products, and warehouses in Neo4j
 def create_relationships():
     """Create relationships between suppliers, products, and warehouses."""
     with driver.session() as session:
-        for rel in relationships:
-            # Create the relationship between a supplier and a product (SUPPLIES)
-            session.run("""
-                MATCH (s:Supplier {id: $supplier_id})
-                MATCH (p:Product {id: $product_id})
-                MERGE (s)-[:SUPPLIES]->(p)
-            """, rel)
-
-            # Create the relationship between a product and a warehouse (STORED_AT)
-            session.run("""
-                MATCH (p:Product {id: $product_id})
-                MATCH (w:Warehouse {id: $warehouse_id})
-                MERGE (p)-[:STORED_AT]->(w)
-            """, rel)
+        # Create the supplier-product (SUPPLIES) and product-warehouse (STORED_AT) relationships in one statement
+        session.run("""
+            UNWIND $rows AS row
+            MATCH (s:Supplier {id: row.supplier_id}),
+                  (p:Product {id: row.product_id}),
+                  (w:Warehouse {id: row.warehouse_id})
+            MERGE (s)-[:SUPPLIES]->(p)
+            MERGE (p)-[:STORED_AT]->(w)
+        """, rows=relationships)
 
 # Function to load all data (products, suppliers, warehouses, routes, relationships)
 def load_all_data():
     """Load all data into Neo4j in sequence."""
+    print("Creating constraints...")
+    create_constraints()
     print("Loading products...")
     load_products()  
     print("Loading suppliers...")